@@ -1,5 +1,6 @@
 #!/usr/bin/env python3
 import sys
+import io
 import re
 import os
 
@@ -40,143 +41,192 @@ REG = {
 for i in range(16):
     REG[f"R{i}"] = i
 
+# -----------------------------------------
+# PRECOMPUTED OPCODE BYTES  (REG << 4 | OP)
+# -----------------------------------------
+_ONEBYTE = {(i, r): (rv << 4) | ov
+            for i, ov in OP.items() if i not in ("SET", "JP")
+            for r, rv in REG.items()}
+_SET_OPCODE = {r: (rv << 4) | OP["SET"] for r, rv in REG.items()}
+
+# token separator and numeric literal (0x?? or decimal, upper-cased source)
+_TOK_RE = re.compile(r"[,\s]+")
+_IMM_RE = re.compile(r"0X[0-9A-F]+|\d+")
+
 # -----------------------------------------
 # ASSEMBLER
+#
+# _HANDLERS entries are called as h(parts, fixups, pc, lineno); only
+# SET uses the trailing arguments, to record label references.
+# Anything else falls through to _emit_reg.
 # -----------------------------------------
 
-def assemble_line(line, labels, pc):
-    line = line.strip()
-
-    if not line or line.startswith(";"):
-        return []
-
-    # Label-only line
-    if line.endswith(":"):
-        return []
-
-    # split tokens
-    parts = re.split(r"[,\s]+", line)
-    instr = parts[0].upper()
-
-    # -------------------------
-    # SET A, imm8   --> 2 bytes
-    # -------------------------
-    if instr == "SET":
-        regname = parts[1].upper()
-        imm_token = parts[2]
-
-        want_high = False
-
-        # high/low suffix
-        if len(parts) == 4:
-            if parts[3].upper() == "H":
-                want_high = True
-            elif parts[3].upper() == "L":
-                want_high = False
-            else:
-                raise ValueError(f"Invalid SET suffix: {parts[3]}")
-
-        # number literal? 0x?? or decimal?
-        if re.fullmatch(r"0x[0-9A-Fa-f]+", imm_token) or imm_token.isdigit():
-            imm = int(imm_token, 0)
-            if want_high:
-                imm = (imm >> 8) & 0xFF
-            else:
-                imm = imm & 0xFF
+# Errors name the offending operand by position rather than quoting the
+# upper-cased token; assemble() appends the source line as written.
+def _int_operand(parts, n):
+    try:
+        return int(parts[n], 0)
+    except ValueError as e:
+        raise ValueError(f"Invalid number (operand {n})") from e
+
+
+# -------------------------
+# SET A, imm8   --> 2 bytes
+# -------------------------
+def _emit_set(parts, fixups, pc, lineno):
+    try:
+        opcode = _SET_OPCODE[parts[1]]
+    except KeyError as e:
+        raise ValueError("Unknown register (operand 1)") from e
+
+    imm_token = parts[2]
+
+    want_high = False
+
+    # high/low suffix
+    if len(parts) == 4:
+        if parts[3] == "H":
+            want_high = True
+        elif parts[3] == "L":
+            want_high = False
+        else:
+            raise ValueError("Invalid SET suffix (operand 3)")
+
+    # number literal? 0x?? or decimal?
+    if _IMM_RE.fullmatch(imm_token):
+        imm = _int_operand(parts, 2)
+        if want_high:
+            imm = (imm >> 8) & 0xFF
         else:
-            # it's a label – second pass will fix it
-            imm = ("LABEL", imm_token, want_high)
-
-        opcode = (REG[regname] << 4) | OP["SET"]
-        return [opcode, imm]
-
-    # -------------------------
-    # JPZ label   → 1 byte
-    # address loaded separately into JUMPL/JUMPH
-    # -------------------------
-    if instr == "JP":
-        bitpos = int(parts[1], 0) & 0x07
-        value = int(parts[2], 0) & 0x1
-        opcode = OP["JP"]
-        return [opcode | (value << 7) | (bitpos << 4)]
-
-    # -------------------------
-    # One-byte register operations:
-    # LDA R
-    # STA R
-    # AND R
-    # ADD R
-    # NOT R
-    # CHG R
-    # -------------------------
-    if instr in OP:
-        regname = parts[1].upper()
-        opcode = (REG[regname] << 4) | OP[instr]
-        return [opcode]
-
-    raise ValueError(f"Unknown instruction: {line}")
+            imm = imm & 0xFF
+    else:
+        # it's a label – emit a placeholder, assemble() backpatches it
+        fixups.append((pc + 1, imm_token, want_high, lineno))
+        imm = 0
+
+    return [opcode, imm]
+
+
+# -------------------------
+# JPZ label   → 1 byte
+# address loaded separately into JUMPL/JUMPH
+# -------------------------
+def _emit_jp(parts, *_):
+    bitpos = _int_operand(parts, 1) & 0x07
+    value = _int_operand(parts, 2) & 0x1
+    opcode = OP["JP"]
+    return [opcode | (value << 7) | (bitpos << 4)]
+
+
+# -------------------------
+# One-byte register operations:
+# LDA R
+# STA R
+# AND R
+# ADD R
+# NOT R
+# CHG R
+# -------------------------
+def _emit_reg(instr, parts):
+    try:
+        return [_ONEBYTE[(instr, parts[1])]]
+    except KeyError as e:
+        if instr not in OP:
+            raise ValueError("Unknown instruction") from e
+        raise ValueError("Unknown register (operand 1)") from e
+
+
+_HANDLERS = {
+    "SET": _emit_set,
+    "JP":  _emit_jp,
+}
+
+
+def assemble_line(line, fixups, pc, lineno):
+    # line is a stripped instruction – blanks, comments and
+    # labels are filtered out by assemble(), which also appends
+    # the original source line to any ValueError raised here.
+    # pc and lineno locate the instruction, for label fixups.
+
+    # split tokens (source is already upper-cased by assemble())
+    parts = _TOK_RE.split(line)
+    instr = parts[0]
+
+    h = _HANDLERS.get(instr)
+    if h:
+        return h(parts, fixups, pc, lineno)
+
+    return _emit_reg(instr, parts)
 
 
 def assemble(source):
     lines = source.split("\n")
 
+    # mnemonics, registers and labels are case-insensitive:
+    # normalise the whole source once instead of every token
+    ulines = source.upper().split("\n")
+
     # =================================
-    # FIRST PASS – LABEL COLLECTION
+    # SINGLE PASS – EMIT + COLLECT LABELS
     # =================================
     labels = {}
-    pc = 0
-    intermediate = []
+    final = bytearray()
+    fixups = []        # (index in final, label, want_high, lineno)
+    sizes = []         # bytes emitted per source line, for the listing
 
-    for line in lines:
+    for lineno, line in enumerate(ulines):
         line = line.strip()
 
-        if line.endswith(":"):
+        if not line or line[0] == ";":
+            sizes.append(0)
+            continue
+
+        if line[-1] == ":":
             lbl = line[:-1]
-            labels[lbl] = pc
-            intermediate.append([])
+            labels[lbl] = len(final)
+            sizes.append(0)
             continue
 
-        result = assemble_line(line, labels, pc)
-        for token in result:
-            pc += 1
-        intermediate.append(result)
+        try:
+            result = assemble_line(line, fixups, len(final), lineno)
+        except ValueError as e:
+            # report the line as written, not upper-cased
+            raise ValueError(f"{e}: {lines[lineno].strip()}") from e
+        final.extend(result)
+        sizes.append(len(result))
 
     # =================================
-    # SECOND PASS – FIXUP LABELS
+    # BACKPATCH LABEL REFERENCES
+    # =================================
+    for idx, label, want_high, lineno in fixups:
+        if label not in labels:
+            raise ValueError(f"Undefined label (operand 2): {lines[lineno].strip()}")
+        addr = labels[label]
+        if want_high:
+            final[idx] = (addr >> 8) & 0xFF
+        else:
+            final[idx] = addr & 0xFF
+
+    # =================================
+    # LISTING
     # =================================
-    final = []
     pc = 0
-    print("-------------------------------------")
+    buf = io.StringIO()
+    buf.write("-------------------------------------\n")
 
     lcntr = 0
 
-    for inst in intermediate:
-        print(f"{pc:04X}: ", end="");
-        bcntr = 0
-        for item in inst:
-            if isinstance(item, tuple) and item[0] == "LABEL":
-                label = item[1]
-                if label not in labels:
-                    raise ValueError(f"Undefined label: {label}")
-                addr = labels[label]
-                if (item[2]):
-                    v = (addr >> 8) & 0xFF
-                else:
-                    v = addr & 0xFF
-                print(f"{v:02X} ", end="")
-                final.append(v)        # low byte
-                pc += 1
-                bcntr += 1
-            else:
-                print(f"{item:02X} ", end="")
-                final.append(item)
-                pc += 1
-                bcntr += 1
-        if (bcntr > 0): 
-            print(" " * (10 - bcntr * 3), end="")
-        print(lines[lcntr].strip())
+    for size in sizes:
+        buf.write(f"{pc:04X}: ")
+        if (size > 0): 
+            buf.write(final[pc:pc + size].hex(" ").upper() + " ")
+            buf.write(" " * (10 - size * 3))
+        pc += size
+        buf.write(lines[lcntr].strip() + "\n")
         lcntr = lcntr+1
 
+    sys.stdout.write(buf.getvalue())
+
     return final 
 
 # -----------------------------------------
@@ -204,7 +254,6 @@ if __name__ == "__main__":
     with open(out, "w") as f:
         for i in range(0, len(machine), 16):
             chunk = machine[i:i+16]
-            line = " ".join(f"{b:02X}" for b in chunk)
-            f.write(line + "\n")
+            f.write(chunk.hex(" ").upper() + "\n")
 
     print(f"Done. Output written to: {out}")